@@ -4,5 +4,9 @@ from .torch_dataloader import TorchDataloader
 from .torch_sampler import get_sampler
 from .default_batcher import DefaultBatcher
 from .concat_batcher import ConcatBatcher
+from .cuda_prefetcher import CUDAPrefetcher, batch_to_device
 
-__all__ = ['TorchDataloader', 'DefaultBatcher', 'ConcatBatcher', 'get_sampler']
+__all__ = [
+    'TorchDataloader', 'DefaultBatcher', 'ConcatBatcher', 'get_sampler',
+    'CUDAPrefetcher', 'batch_to_device'
+]
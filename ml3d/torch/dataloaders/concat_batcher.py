@@ -13,6 +13,17 @@ from ..models.kpconv import batch_grid_subsampling, batch_neighbors
 from torch.utils.data import Sampler, get_worker_info
 
 
+def _on_device(tensor, device):
+    """Whether tensor is on device. A device without index, e.g. 'cuda',
+    refers to the current device of that type."""
+    device = torch.device(device)
+    if tensor.device.type != device.type:
+        return False
+    if device.index is None and device.type == 'cuda':
+        device = torch.device('cuda', torch.cuda.current_device())
+    return device.index is None or tensor.device.index == device.index
+
+
 class KPConvBatch:
     """Batched results for KPConv."""
 
@@ -324,19 +335,37 @@ class KPConvBatch:
 
         return self
 
-    def to(self, device):
+    def to(self, device, non_blocking=False):
+        """Move all tensors to the given device.
 
-        self.points = [in_tensor.to(device) for in_tensor in self.points]
-        self.neighbors = [in_tensor.to(device) for in_tensor in self.neighbors]
-        self.pools = [in_tensor.to(device) for in_tensor in self.pools]
-        self.upsamples = [in_tensor.to(device) for in_tensor in self.upsamples]
-        self.lengths = [in_tensor.to(device) for in_tensor in self.lengths]
-        self.features = self.features.to(device)
-        self.labels = self.labels.to(device)
-        self.scales = self.scales.to(device)
-        self.rots = self.rots.to(device)
-        self.frame_inds = self.frame_inds.to(device)
-        self.frame_centers = self.frame_centers.to(device)
+        Args:
+            device: Target torch device.
+            non_blocking: Copy asynchronously w.r.t. the host. Only effective
+                for host to device copies from pinned memory.
+
+        Returns:
+            The batch itself.
+        """
+        if _on_device(self.features, device):
+            return self
+        kw = dict(non_blocking=non_blocking)
+        self.points = [in_tensor.to(device, **kw) for in_tensor in self.points]
+        self.neighbors = [
+            in_tensor.to(device, **kw) for in_tensor in self.neighbors
+        ]
+        self.pools = [in_tensor.to(device, **kw) for in_tensor in self.pools]
+        self.upsamples = [
+            in_tensor.to(device, **kw) for in_tensor in self.upsamples
+        ]
+        self.lengths = [
+            in_tensor.to(device, **kw) for in_tensor in self.lengths
+        ]
+        self.features = self.features.to(device, **kw)
+        self.labels = self.labels.to(device, **kw)
+        self.scales = self.scales.to(device, **kw)
+        self.rots = self.rots.to(device, **kw)
+        self.frame_inds = self.frame_inds.to(device, **kw)
+        self.frame_centers = self.frame_centers.to(device, **kw)
 
         return self
 
@@ -430,10 +459,19 @@ class SparseConvUnetBatch:
         self.label = [label.pin_memory() for label in self.label]
         return self
 
-    def to(self, device):
-        self.point = [pc.to(device) for pc in self.point]
-        self.feat = [feat.to(device) for feat in self.feat]
-        self.label = [label.to(device) for label in self.label]
+    def to(self, device, non_blocking=False):
+        if not self.point or _on_device(self.point[0], device):
+            return self
+        self.point = [
+            pc.to(device, non_blocking=non_blocking) for pc in self.point
+        ]
+        self.feat = [
+            feat.to(device, non_blocking=non_blocking) for feat in self.feat
+        ]
+        self.label = [
+            label.to(device, non_blocking=non_blocking) for label in self.label
+        ]
+        return self
 
     @staticmethod
     def scatter(batch, num_gpu):
@@ -478,10 +516,13 @@ class PointTransformerBatch:
         self.label = self.label.pin_memory()
         return self
 
-    def to(self, device):
-        self.point = self.point.to(device)
-        self.feat = self.feat.to(device)
-        self.label = self.label.to(device)
+    def to(self, device, non_blocking=False):
+        if _on_device(self.point, device):
+            return self
+        self.point = self.point.to(device, non_blocking=non_blocking)
+        self.feat = self.feat.to(device, non_blocking=non_blocking)
+        self.label = self.label.to(device, non_blocking=non_blocking)
+        return self
 
 
 class ObjectDetectBatch:
@@ -527,13 +568,18 @@ class ObjectDetectBatch:
 
         return self
 
-    def to(self, device):
+    def to(self, device, non_blocking=False):
+        if not self.point or _on_device(self.point[0], device):
+            return self
         for i in range(len(self.point)):
-            self.point[i] = self.point[i].to(device)
+            self.point[i] = self.point[i].to(device, non_blocking=non_blocking)
             if self.labels[i] is not None:
-                self.labels[i] = self.labels[i].to(device)
+                self.labels[i] = self.labels[i].to(device,
+                                                   non_blocking=non_blocking)
             if self.bboxes[i] is not None:
-                self.bboxes[i] = self.bboxes[i].to(device)
+                self.bboxes[i] = self.bboxes[i].to(device,
+                                                   non_blocking=non_blocking)
+        return self
 
     @staticmethod
     def scatter(batch, num_gpu):
@@ -579,9 +625,9 @@ class ConcatBatcher(object):
             class: the batched result
         """
         if self.model == "KPConv" or self.model == "KPFCNN":
-            batching_result = KPConvBatch(batches)
-            batching_result.to(self.device)
-            return {'data': batching_result, 'attr': []}
+            # Tensors stay on the host here so that the DataLoader can pin
+            # them; the pipeline moves the batch to the device.
+            return {'data': KPConvBatch(batches), 'attr': []}
 
         elif self.model == "SparseConvUnet":
             return {'data': SparseConvUnetBatch(batches), 'attr': {}}
@@ -0,0 +1,102 @@
+import torch
+
+
+def batch_to_device(batch, device, non_blocking=False):
+    """Move a collated batch to the given device.
+
+    Handles tensors and batch classes implementing `to()` as well as
+    (nested) dicts, lists and tuples of those. Other values are returned
+    unchanged.
+
+    Args:
+        batch: Output of a batcher's collate_fn.
+        device: Target torch device.
+        non_blocking: Copy asynchronously w.r.t. the host.
+
+    Returns:
+        The batch on the target device.
+    """
+    if hasattr(batch, 'to'):
+        return batch.to(device, non_blocking=non_blocking)
+    if isinstance(batch, dict):
+        return {
+            key: batch_to_device(val, device, non_blocking)
+            for key, val in batch.items()
+        }
+    if isinstance(batch, list):
+        return [batch_to_device(val, device, non_blocking) for val in batch]
+    if isinstance(batch, tuple) and not hasattr(batch, '_fields'):
+        return tuple(
+            batch_to_device(val, device, non_blocking) for val in batch)
+    return batch
+
+
+class CUDAPrefetcher(object):
+    """Wraps a DataLoader and copies the next batch to the GPU on a side
+    stream while the current batch is being processed.
+
+    The loader should pin memory so that the copies are asynchronous. On
+    non-CUDA devices batches are moved synchronously.
+
+    Example:
+        This example iterates over a DataLoader of semantic segmentation
+        batches:
+
+            for inputs in CUDAPrefetcher(train_loader, device):
+                results = model(inputs['data'])
+    """
+
+    def __init__(self, loader, device):
+        """Initialize.
+
+        Args:
+            loader: A torch DataLoader yielding dicts with a 'data' key.
+            device: The device the batches are moved to.
+
+        Returns:
+            class: The corresponding class.
+        """
+        self.loader = loader
+        self.device = torch.device(device)
+        if self.device.type == 'cuda':
+            self.stream = torch.cuda.Stream(device=self.device)
+        else:
+            self.stream = None
+        self.next_inputs = None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        self.loader_iter = iter(self.loader)
+        self.preload()
+        return self
+
+    def preload(self):
+        """Fetch the next batch and start copying it to the device."""
+        try:
+            inputs = next(self.loader_iter)
+        except StopIteration:
+            self.next_inputs = None
+            return
+
+        if self.stream is None:
+            inputs['data'] = batch_to_device(inputs['data'], self.device)
+        else:
+            # Memory of the previous batch may be reused for this copy, so
+            # wait for the work already queued on the compute stream.
+            self.stream.wait_stream(torch.cuda.current_stream(self.device))
+            with torch.cuda.stream(self.stream):
+                inputs['data'] = batch_to_device(inputs['data'],
+                                                 self.device,
+                                                 non_blocking=True)
+        self.next_inputs = inputs
+
+    def __next__(self):
+        if self.next_inputs is None:
+            raise StopIteration
+        if self.stream is not None:
+            torch.cuda.current_stream(self.device).wait_stream(self.stream)
+        inputs = self.next_inputs
+        self.preload()
+        return inputs
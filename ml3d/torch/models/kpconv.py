@@ -388,9 +388,7 @@ class KPFCNN(BaseModel):
         data['search_tree'] = search_tree
 
         if split in ["test", "testing", "validation", "valid"]:
-            proj_inds = np.squeeze(
-                search_tree.query(points, return_distance=False))
-            proj_inds = proj_inds.astype(np.int32)
+            proj_inds = DataProcessing.knn_search(sub_points, points, 1)[:, 0]
             data['proj_inds'] = proj_inds
 
         return data
@@ -553,6 +551,7 @@ class KPFCNN(BaseModel):
         data = self.transform(self.inference_data, attr, is_test=True)
         inputs = {'data': data, 'attr': attr}
         inputs = self.batcher.collate_fn([inputs])
+        inputs['data'].to(self.device)
         self.inference_input = inputs
 
         return inputs
@@ -560,26 +559,22 @@ class KPFCNN(BaseModel):
     def update_probs(self, inputs, results, test_probs):
         self.test_smooth = 0.95
         stk_probs = torch.nn.functional.softmax(results, dim=-1)
-        stk_probs = stk_probs.cpu().data.numpy()
+        stk_probs = stk_probs.to(torch.float16)
 
         batch = inputs['data']
-        stk_labels = batch.labels.cpu().data.numpy()
 
-        # Get probs and labels
+        # Get probs
         lengths = batch.lengths[0].cpu().numpy()
 
-        f_inds = batch.frame_inds.cpu().numpy()
-        r_inds_list = batch.reproj_inds
         r_mask_list = batch.reproj_masks
-        labels_list = batch.val_labels
 
         i0 = 0
         for b_i, length in enumerate(lengths):
             # Get prediction
             probs = stk_probs[i0:i0 + length]
 
-            proj_inds = r_inds_list[b_i]
-            proj_mask = r_mask_list[b_i]
+            proj_mask = torch.as_tensor(r_mask_list[b_i],
+                                        device=test_probs.device)
             test_probs[proj_mask] = self.test_smooth * test_probs[proj_mask] + (
                 1 - self.test_smooth) * probs
             i0 += length
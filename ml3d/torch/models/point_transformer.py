@@ -249,9 +249,7 @@ class PointTransformer(BaseModel):
         data['search_tree'] = search_tree
 
         if attr['split'] in ["test", "testing"]:
-            proj_inds = np.squeeze(
-                search_tree.query(points, return_distance=False))
-            proj_inds = proj_inds.astype(np.int32)
+            proj_inds = DataProcessing.knn_search(sub_points, points, 1)[:, 0]
             data['proj_inds'] = proj_inds
 
         return data
@@ -306,7 +304,7 @@ class PointTransformer(BaseModel):
 
     def update_probs(self, inputs, results, test_probs):
         result = results.reshape(-1, self.cfg.num_classes)
-        probs = torch.nn.functional.softmax(result, dim=-1).cpu().data.numpy()
+        probs = torch.nn.functional.softmax(result, dim=-1).to(torch.float16)
 
         self.trans_point_sampler(patchwise=False)
 
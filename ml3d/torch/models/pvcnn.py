@@ -252,7 +252,7 @@ class PVCNN(BaseModel):
 
     def update_probs(self, inputs, results, test_probs):
         result = results.reshape(-1, self.cfg.num_classes)
-        probs = torch.nn.functional.softmax(result, dim=-1).cpu().data.numpy()
+        probs = torch.nn.functional.softmax(result, dim=-1).to(torch.float16)
 
         self.trans_point_sampler(patchwise=False)
 
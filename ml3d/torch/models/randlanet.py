@@ -146,9 +146,7 @@ class RandLANet(BaseModel):
         data['search_tree'] = search_tree
 
         if split in ["test", "testing"]:
-            proj_inds = np.squeeze(
-                search_tree.query(points, return_distance=False))
-            proj_inds = proj_inds.astype(np.int32)
+            proj_inds = DataProcessing.knn_search(sub_points, points, 1)[:, 0]
             data['proj_inds'] = proj_inds
 
         return data
@@ -444,7 +442,8 @@ class RandLANet(BaseModel):
         Args:
             inputs: input to the model.
             results: output of the model.
-            test_probs: probabilities for whole pointcloud
+            test_probs: probabilities for whole pointcloud, a float16 tensor
+                on the device of results.
 
         Returns:
             updated probabilities
@@ -452,12 +451,17 @@ class RandLANet(BaseModel):
         """
         self.test_smooth = 0.95
 
-        for b in range(results.size()[0]):
+        batch_probs = torch.reshape(
+            results, (results.size()[0], -1, self.cfg.num_classes))
+        batch_probs = torch.nn.functional.softmax(batch_probs, dim=-1)
+        batch_probs = batch_probs.to(torch.float16)
+        batch_inds = torch.as_tensor(inputs['data']['point_inds'],
+                                     dtype=torch.int64,
+                                     device=test_probs.device)
 
-            result = torch.reshape(results[b], (-1, self.cfg.num_classes))
-            probs = torch.nn.functional.softmax(result, dim=-1)
-            probs = probs.cpu().data.numpy()
-            inds = inputs['data']['point_inds'][b]
+        for b in range(results.size()[0]):
+            probs = batch_probs[b]
+            inds = batch_inds[b]
 
             test_probs[inds] = self.test_smooth * test_probs[inds] + (
                 1 - self.test_smooth) * probs
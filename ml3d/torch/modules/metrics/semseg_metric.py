@@ -1,4 +1,5 @@
 import numpy as np
+import torch
 import warnings
 
 
@@ -6,22 +7,32 @@ class SemSegMetric(object):
     """Metrics for semantic segmentation.
 
     Accumulate confusion matrix over training loop and
-    computes accuracy and mean IoU.
+    computes accuracy and mean IoU. The confusion matrix is kept on the
+    device of the scores and only copied to the host to compute metrics.
     """
 
     def __init__(self):
         super(SemSegMetric, self).__init__()
         self.confusion_matrix = None
         self.num_classes = None
+        self.host_confusion_matrix = None
 
     def update(self, scores, labels):
         conf = self.get_confusion_matrix(scores, labels)
         if self.confusion_matrix is None:
-            self.confusion_matrix = conf.copy()
+            self.confusion_matrix = conf.clone()
             self.num_classes = conf.shape[0]
         else:
             assert self.confusion_matrix.shape == conf.shape
-            self.confusion_matrix += conf
+            self.confusion_matrix += conf.to(self.confusion_matrix.device)
+        self.host_confusion_matrix = None
+
+    def get_host_confusion_matrix(self):
+        """Host copy of the confusion matrix, cached until the next update."""
+        if self.host_confusion_matrix is None:
+            conf = self.confusion_matrix.cpu().numpy()
+            self.host_confusion_matrix = conf.astype(np.longlong)
+        return self.host_confusion_matrix
 
     def acc(self):
         """Compute the per-class accuracies and the overall accuracy.
@@ -39,17 +50,12 @@ class SemSegMetric(object):
         if self.confusion_matrix is None:
             return None
 
-        accs = []
-        for label in range(self.num_classes):
-            tp = np.longlong(self.confusion_matrix[label, label])
-            fn = np.longlong(self.confusion_matrix[label, :].sum()) - tp
-
-            if tp + fn == 0:
-                acc = float('nan')
-            else:
-                acc = tp / (tp + fn)
+        conf = self.get_host_confusion_matrix()
+        tp = np.diag(conf)
+        fn = conf.sum(axis=1) - tp
 
-            accs.append(acc)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            accs = np.where(tp + fn == 0, np.nan, tp / (tp + fn)).tolist()
 
         accs.append(np.nanmean(accs))
 
@@ -71,25 +77,23 @@ class SemSegMetric(object):
         if self.confusion_matrix is None:
             return None
 
-        ious = []
-        for label in range(self.num_classes):
-            tp = np.longlong(self.confusion_matrix[label, label])
-            fn = np.longlong(self.confusion_matrix[label, :].sum()) - tp
-            fp = np.longlong(self.confusion_matrix[:, label].sum()) - tp
-
-            if tp + fp + fn == 0:
-                iou = float('nan')
-            else:
-                iou = (tp) / (tp + fp + fn)
+        conf = self.get_host_confusion_matrix()
+        tp = np.diag(conf)
+        fn = conf.sum(axis=1) - tp
+        fp = conf.sum(axis=0) - tp
 
-            ious.append(iou)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ious = np.where(tp + fp + fn == 0, np.nan,
+                            tp / (tp + fp + fn)).tolist()
 
         ious.append(np.nanmean(ious))
 
         return ious
 
     def reset(self):
-        self.confusion_matrix = None
+        if self.confusion_matrix is not None:
+            self.confusion_matrix.zero_()
+        self.host_confusion_matrix = None
 
     @staticmethod
     def get_confusion_matrix(scores, labels):
@@ -102,23 +106,21 @@ class SemSegMetric(object):
                 ground truth labels.
 
         Returns:
-            Confusion matrix for current batch.
+            Confusion matrix for current batch, as a tensor on the device of
+            scores.
         """
         C = scores.size(-1)
-        y_pred = scores.detach().cpu().numpy().reshape(-1, C)  # (N, C)
-        y_pred = np.argmax(y_pred, axis=1)  # (N,)
+        y_pred = scores.detach().reshape(-1, C).argmax(dim=1)  # (N,)
 
-        y_true = labels.detach().cpu().numpy().reshape(-1,)
+        y_true = labels.detach().reshape(-1,).to(y_pred.device,
+                                                 dtype=torch.int64)
 
-        y = np.bincount(C * y_true + y_pred, minlength=C * C)
+        y = torch.bincount(C * y_true + y_pred, minlength=C * C)
 
-        if len(y) < C * C:
-            y = np.concatenate([y, np.zeros((C * C - len(y)), dtype=np.long)])
-        else:
-            if len(y) > C * C:
-                warnings.warn(
-                    "Prediction has fewer classes than ground truth. This may affect accuracy."
-                )
+        if len(y) > C * C:
+            warnings.warn(
+                "Prediction has fewer classes than ground truth. This may affect accuracy."
+            )
             y = y[-(C * C):]  # last c*c elements.
 
         y = y.reshape(C, C)
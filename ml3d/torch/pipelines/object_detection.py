@@ -181,7 +181,10 @@ class ObjectDetection(BasePipeline):
             'record_for', [])
         log.info("Started validation")
 
-        self.valid_losses = {}
+        # Per-loss sums stay on the device and are reduced over all ranks
+        # at the end.
+        valid_loss_sums = {}
+        num_batches = 0
 
         pred = []
         gt = []
@@ -191,9 +194,8 @@ class ObjectDetection(BasePipeline):
                 results = model(data)
                 loss = model.get_loss(results, data)
                 for l, v in loss.items():
-                    if l not in self.valid_losses:
-                        self.valid_losses[l] = []
-                    self.valid_losses[l].append(v.cpu().numpy())
+                    valid_loss_sums[l] = valid_loss_sums.get(l, 0) + v.detach()
+                num_batches += 1
 
                 # convert to bboxes for mAP evaluation
                 boxes = model.inference_end(results, data)
@@ -206,11 +208,13 @@ class ObjectDetection(BasePipeline):
                                                                 results=results)
                 record_summary = False  # Save only for the first batch
 
+        self.valid_losses = self.reduce_losses(valid_loss_sums, num_batches)
+
         sum_loss = 0
         desc = "validation - "
         for l, v in self.valid_losses.items():
-            desc += " %s: %.03f" % (l, np.mean(v))
-            sum_loss += np.mean(v)
+            desc += " %s: %.03f" % (l, v)
+            sum_loss += v
         desc += " > loss: %.03f" % sum_loss
 
         log.info(desc)
@@ -220,17 +224,16 @@ class ObjectDetection(BasePipeline):
         difficulties = cfg.get("difficulties", [0])
 
         if self.distributed:
-            gt_gather = [None for _ in range(dist.get_world_size())]
-            pred_gather = [None for _ in range(dist.get_world_size())]
-
-            dist.gather_object(gt, gt_gather if self.rank == 0 else None, dst=0)
-            dist.gather_object(pred,
-                               pred_gather if self.rank == 0 else None,
+            # Boxes are variable sized python objects, gather them together
+            # in a single call.
+            gather = [None for _ in range(dist.get_world_size())]
+            dist.gather_object((gt, pred),
+                               gather if self.rank == 0 else None,
                                dst=0)
 
             if self.rank == 0:
-                gt = sum(gt_gather, [])
-                pred = sum(pred_gather, [])
+                gt = sum((g for g, _ in gather), [])
+                pred = sum((p for _, p in gather), [])
 
         if self.rank != 0:
             return
@@ -337,8 +340,17 @@ class ObjectDetection(BasePipeline):
         # wrap model for multiple GPU
         if self.distributed:
             model.cuda(self.device)
+            # Larger buckets mean fewer, bigger all-reduce calls. Set
+            # ddp_find_unused only if some parameters do not receive
+            # gradients every step; ddp_static_graph when the set of used
+            # parameters never changes.
             model = torch.nn.parallel.DistributedDataParallel(
-                model, device_ids=[self.device])
+                model,
+                device_ids=[self.device],
+                bucket_cap_mb=cfg.get('ddp_bucket_mb', 100),
+                gradient_as_bucket_view=True,
+                find_unused_parameters=cfg.get('ddp_find_unused', False),
+                static_graph=cfg.get('ddp_static_graph', False))
             model.get_loss = model.module.get_loss
             model.cfg = model.module.cfg
             model.inference_end = model.module.inference_end
@@ -355,7 +367,10 @@ class ObjectDetection(BasePipeline):
                 train_sampler.set_epoch(epoch)
 
             model.train()
-            self.losses = {}
+            # Per-loss sums stay on the device and are reduced over all ranks
+            # at the end of the epoch.
+            loss_sums = {}
+            num_steps = 0
 
             process_bar = tqdm(train_loader, desc='training')
             for data in process_bar:
@@ -364,7 +379,7 @@ class ObjectDetection(BasePipeline):
                 loss = model.get_loss(results, data)
                 loss_sum = sum(loss.values())
 
-                self.optimizer.zero_grad()
+                self.optimizer.zero_grad(set_to_none=True)
                 loss_sum.backward()
                 if self.distributed:
                     if model.module.cfg.get('grad_clip_norm', -1) > 0:
@@ -385,18 +400,20 @@ class ObjectDetection(BasePipeline):
                                                                 data,
                                                                 epoch,
                                                                 results=results)
-                desc = "training - "
                 for l, v in loss.items():
-                    if l not in self.losses:
-                        self.losses[l] = []
-                    self.losses[l].append(v.cpu().detach().numpy())
-                    desc += " %s: %.03f" % (l, v.cpu().detach().numpy())
-                desc += " > loss: %.03f" % loss_sum.cpu().detach().numpy()
-                process_bar.set_description(desc)
-                process_bar.refresh()
+                    loss_sums[l] = loss_sums.get(l, 0) + v.detach()
+                num_steps += 1
 
-                if self.distributed:
-                    dist.barrier()
+                # Reading the losses on the host waits for the device, so
+                # only do it every few steps.
+                if num_steps % cfg.get('log_every', 50) == 0:
+                    desc = "training - "
+                    for l, v in loss.items():
+                        desc += " %s: %.03f" % (l, v.item())
+                    desc += " > loss: %.03f" % loss_sum.item()
+                    process_bar.set_description(desc)
+
+            self.losses = self.reduce_losses(loss_sums, num_steps)
 
             if self.scheduler is not None:
                 self.scheduler.step()
@@ -412,6 +429,27 @@ class ObjectDetection(BasePipeline):
                 if epoch % cfg.save_ckpt_freq == 0 or epoch == cfg.max_epoch:
                     self.save_ckpt(epoch)
 
+    def reduce_losses(self, loss_sums, count):
+        """Average summed losses over the steps of all ranks.
+
+        The sums and the step count are packed in one tensor so a single
+        all_reduce is needed in distributed training.
+
+        Args:
+            loss_sums: Dict of loss name to the summed loss tensor.
+            count: Number of steps summed on this rank.
+
+        Returns:
+            Dict of loss name to the mean loss.
+        """
+        names = list(loss_sums.keys())
+        buf = torch.stack([loss_sums[l].float().reshape(()) for l in names] +
+                          [torch.tensor(float(count), device=self.device)])
+        if self.distributed:
+            dist.all_reduce(buf, op=dist.ReduceOp.SUM)
+        buf = buf.cpu().numpy()
+        return {l: buf[i] / max(buf[-1], 1) for i, l in enumerate(names)}
+
     def get_3d_summary(self,
                        infer_bboxes_batch,
                        inputs_batch,
@@ -552,9 +590,13 @@ class ObjectDetection(BasePipeline):
             raise FileNotFoundError(f' ckpt {ckpt_path} not found')
 
         log.info(f'Loading checkpoint {ckpt_path}')
-        ckpt = torch.load(ckpt_path, map_location=self.device)
+        if self.distributed:
+            ckpt = self.broadcast_ckpt(ckpt_path)
+        else:
+            ckpt = torch.load(ckpt_path, map_location=self.device)
+            model = getattr(self.model, 'module', self.model)
+            model.load_state_dict(ckpt['model_state_dict'])
 
-        self.model.load_state_dict(ckpt['model_state_dict'])
         if 'optimizer_state_dict' in ckpt and hasattr(self, 'optimizer'):
             log.info('Loading checkpoint optimizer_state_dict')
             self.optimizer.load_state_dict(ckpt['optimizer_state_dict'])
@@ -564,12 +606,42 @@ class ObjectDetection(BasePipeline):
 
         return epoch
 
+    def broadcast_ckpt(self, ckpt_path):
+        """Read a checkpoint on rank 0 only and share it with the other ranks.
+
+        The model weights are loaded on rank 0 and broadcast tensor by tensor
+        on the device, the remaining states are broadcast as one object.
+
+        Args:
+            ckpt_path: Path of the checkpoint.
+
+        Returns:
+            The checkpoint without its model_state_dict.
+        """
+        # Checkpoints hold the weights of the unwrapped model.
+        model = getattr(self.model, 'module', self.model)
+        ckpt = None
+        if self.rank == 0:
+            ckpt = torch.load(ckpt_path, map_location='cpu')
+            model.load_state_dict(ckpt.pop('model_state_dict'))
+
+        for tensor in model.state_dict().values():
+            buf = tensor.to(self.device)
+            dist.broadcast(buf, src=0)
+            tensor.copy_(buf)
+
+        objects = [ckpt]
+        dist.broadcast_object_list(objects, src=0)
+        return objects[0]
+
     def save_ckpt(self, epoch):
         path_ckpt = join(self.cfg.logs_dir, 'checkpoint')
         make_dir(path_ckpt)
+        # Unwrap DDP so the keys have no 'module.' prefix.
+        model = getattr(self.model, 'module', self.model)
         torch.save(
             dict(epoch=epoch,
-                 model_state_dict=self.model.state_dict(),
+                 model_state_dict=model.state_dict(),
                  optimizer_state_dict=self.optimizer.state_dict()),
             # scheduler_state_dict=self.scheduler.state_dict()),
             join(path_ckpt, f'ckpt_{epoch:05d}.pth'))
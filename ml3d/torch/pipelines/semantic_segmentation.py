@@ -1,7 +1,9 @@
 import logging
+import os
 from os.path import exists, join
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from tqdm import tqdm
@@ -12,7 +14,8 @@ from torch.utils.data import DataLoader
 # pylint: disable-next=unused-import
 from open3d.visualization.tensorboard_plugin import summary
 from .base_pipeline import BasePipeline
-from ..dataloaders import get_sampler, TorchDataloader, DefaultBatcher, ConcatBatcher
+from ..dataloaders import (get_sampler, TorchDataloader, DefaultBatcher,
+                           ConcatBatcher, CUDAPrefetcher, batch_to_device)
 from ..utils import latest_torch_ckpt
 from ..modules.losses import SemSegLoss, filter_valid_label
 from ..modules.metrics import SemSegMetric
@@ -22,6 +25,83 @@ from ...datasets import InferenceDummySplit
 log = logging.getLogger(__name__)
 
 
+def _cpu_snapshot(state):
+    """Copy of a (nested) state dict with every tensor cloned to the host."""
+    if torch.is_tensor(state):
+        return state.detach().to('cpu', copy=True)
+    if isinstance(state, dict):
+        copy = type(state)(
+            (key, _cpu_snapshot(val)) for key, val in state.items())
+        if hasattr(state, '_metadata'):
+            # Module versions used by load_state_dict.
+            copy._metadata = state._metadata
+        return copy
+    if isinstance(state, (list, tuple)):
+        return type(state)(_cpu_snapshot(val) for val in state)
+    return state
+
+
+def _strided_row_inds(row_splits, num_clouds, max_pts):
+    """Row indices of at most max_pts evenly strided points from each of the
+    first num_clouds point clouds of a batch.
+
+    The per cloud bounds, strides and sizes are computed as arrays over all
+    clouds at once, on the device of row_splits.
+
+    Args:
+        row_splits: (B + 1,) int64 tensor of row splits of the batch.
+        num_clouds: Number of leading point clouds to take points from.
+        max_pts: Maximum number of points taken from each cloud.
+
+    Returns:
+        The flat int64 row indices, or None if no cloud is strided and all
+        leading rows are taken, and the list of points taken per cloud.
+    """
+    starts = row_splits[:num_clouds]
+    ends = row_splits[1:num_clouds + 1]
+    blens = ends - starts
+    # Integer ceil divisions.
+    steps = (-(-blens // blens.clamp(1, max_pts))).clamp(min=1)
+    counts = -(-blens // steps)
+    # Only the per cloud sizes and steps are needed on the host.
+    sizes, host_steps = torch.stack((counts, steps)).tolist()
+    if max(host_steps) == 1:
+        return None, sizes
+    cloud = torch.arange(num_clouds, device=counts.device)
+    cloud = torch.repeat_interleave(cloud, counts, output_size=sum(sizes))
+    first = torch.cumsum(counts, 0) - counts
+    pos = torch.arange(sum(sizes), device=counts.device) - first[cloud]
+    return starts[cloud] + pos * steps[cloud], sizes
+
+
+class LossAccum(object):
+    """Running mean of a loss. The sum stays on the device of the losses and
+    is only read on the host by mean()."""
+
+    def __init__(self):
+        self.sum = 0.0
+        self.n = 0
+
+    def add(self, loss):
+        self.sum = self.sum + loss.detach()
+        self.n += 1
+
+    def mean(self):
+        if self.n == 0:
+            return float('nan')
+        return float(self.sum) / self.n
+
+
+def _row_splits_from_lengths(lengths):
+    """Row splits [0, l0, l0 + l1, ...] of a batch from its lengths. Tensor
+    lengths stay on their device."""
+    lengths = torch.as_tensor(lengths, dtype=torch.int64)
+    row_splits = lengths.new_empty(lengths.numel() + 1)
+    row_splits[0] = 0
+    torch.cumsum(lengths, 0, out=row_splits[1:])
+    return row_splits
+
+
 class SemanticSegmentation(BasePipeline):
     """This class allows you to perform semantic segmentation for both training
     and inference using the Torch. This pipeline has multiple stages: Pre-
@@ -118,6 +198,9 @@ class SemanticSegmentation(BasePipeline):
                          split=split,
                          train_sum_dir=train_sum_dir,
                          **kwargs)
+        # Checkpoints are written in the background, one at a time.
+        self.ckpt_executor = ThreadPoolExecutor(max_workers=1)
+        self.ckpt_future = None
 
     def run_inference(self, data):
         """Run inference on given data.
@@ -145,9 +228,12 @@ class SemanticSegmentation(BasePipeline):
                                       transform=model.transform,
                                       sampler=infer_sampler,
                                       use_cache=False)
+        self.torch_split = infer_split
         infer_loader = DataLoader(infer_split,
                                   batch_size=cfg.batch_size,
                                   sampler=get_sampler(infer_sampler),
+                                  pin_memory=cfg.get('pin_memory',
+                                                     device.type == 'cuda'),
                                   collate_fn=batcher.collate_fn)
 
         model.trans_point_sampler = infer_sampler.get_point_sampler()
@@ -158,6 +244,9 @@ class SemanticSegmentation(BasePipeline):
 
         with torch.no_grad():
             for unused_step, inputs in enumerate(infer_loader):
+                inputs['data'] = batch_to_device(inputs['data'],
+                                                 device,
+                                                 non_blocking=True)
                 results = model(inputs['data'])
                 self.update_tests(infer_sampler, inputs, results)
 
@@ -166,16 +255,18 @@ class SemanticSegmentation(BasePipeline):
             'predict_scores': self.ori_test_probs.pop()
         }
 
-        metric = SemSegMetric()
+        gt_labels = data.get('label', None)
+        if gt_labels is not None and (gt_labels > 0).any():
+            metric = SemSegMetric()
 
-        valid_scores, valid_labels = filter_valid_label(
-            torch.tensor(inference_result['predict_scores']),
-            torch.tensor(data['label']), model.cfg.num_classes,
-            model.cfg.ignored_label_inds, device)
+            valid_scores, valid_labels = filter_valid_label(
+                torch.as_tensor(inference_result['predict_scores']),
+                torch.as_tensor(gt_labels), model.cfg.num_classes,
+                model.cfg.ignored_label_inds, device)
 
-        metric.update(valid_scores, valid_labels)
-        log.info(f"Accuracy : {metric.acc()}")
-        log.info(f"IoU : {metric.iou()}")
+            metric.update(valid_scores, valid_labels)
+            log.info(f"Accuracy : {metric.acc()}")
+            log.info(f"IoU : {metric.iou()}")
 
         return inference_result
 
@@ -187,6 +278,8 @@ class SemanticSegmentation(BasePipeline):
         cfg = self.cfg
         model.device = device
         model.to(device)
+        if cfg.get('channels_last', False) and device.type == 'cuda':
+            model.to(memory_format=torch.channels_last)
         model.eval()
         self.metric_test = SemSegMetric()
 
@@ -195,7 +288,7 @@ class SemanticSegmentation(BasePipeline):
         log.info("DEVICE : {}".format(device))
         log_file_path = join(cfg.logs_dir, 'log_test_' + timestamp + '.txt')
         log.info("Logging in file : {}".format(log_file_path))
-        log.addHandler(logging.FileHandler(log_file_path))
+        self.set_log_file(log_file_path)
 
         batcher = self.get_batcher(device)
 
@@ -209,9 +302,12 @@ class SemanticSegmentation(BasePipeline):
         test_loader = DataLoader(test_split,
                                  batch_size=cfg.test_batch_size,
                                  sampler=get_sampler(test_sampler),
+                                 pin_memory=cfg.get('pin_memory',
+                                                    device.type == 'cuda'),
                                  collate_fn=batcher.collate_fn)
 
         self.dataset_split = test_dataset
+        self.torch_split = test_split
 
         self.load_ckpt(model.cfg.ckpt_path)
 
@@ -226,8 +322,9 @@ class SemanticSegmentation(BasePipeline):
 
         with torch.no_grad():
             for unused_step, inputs in enumerate(test_loader):
-                if hasattr(inputs['data'], 'to'):
-                    inputs['data'].to(device)
+                inputs['data'] = batch_to_device(inputs['data'],
+                                                 device,
+                                                 non_blocking=True)
                 results = model(inputs['data'])
                 self.update_tests(test_sampler, inputs, results)
 
@@ -248,8 +345,10 @@ class SemanticSegmentation(BasePipeline):
                             device)
 
                         self.metric_test.update(valid_scores, valid_labels)
-                        log.info(f"Accuracy : {self.metric_test.acc()}")
-                        log.info(f"IoU : {self.metric_test.iou()}")
+                        if test_sampler.cloud_id % cfg.get(
+                                'log_every_clouds', 10) == 0:
+                            log.info(f"Accuracy : {self.metric_test.acc()}")
+                            log.info(f"IoU : {self.metric_test.iou()}")
                     dataset.save_test_result(inference_result, attr)
                     # Save only for the first batch
                     if 'test' in record_summary and 'test' not in self.summary:
@@ -272,42 +371,60 @@ class SemanticSegmentation(BasePipeline):
                              desc="{} {}/{}".format(split, self.curr_cloud_id,
                                                     len(sampler.dataset)))
             self.pbar_update = 0
+            # Accumulate on the device, the cloud is copied to the host once
+            # it is complete.
             self.test_probs.append(
-                np.zeros(shape=[num_points, self.model.cfg.num_classes],
-                         dtype=np.float16))
+                torch.zeros((num_points, self.model.cfg.num_classes),
+                            dtype=torch.float16,
+                            device=self.device))
             self.complete_infer = False
 
-        this_possiblility = sampler.possibilities[sampler.cloud_id]
-        self.pbar.update(
-            this_possiblility[this_possiblility > end_threshold].shape[0] -
-            self.pbar_update)
-        self.pbar_update = this_possiblility[
-            this_possiblility > end_threshold].shape[0]
         self.test_probs[self.curr_cloud_id] = self.model.update_probs(
             inputs,
             results,
             self.test_probs[self.curr_cloud_id],
         )
 
-        if (split in ['test'] and
-                this_possiblility[this_possiblility > end_threshold].shape[0]
-                == this_possiblility.shape[0]):
-
-            proj_inds = self.model.preprocess(
-                self.dataset_split.get_data(self.curr_cloud_id), {
-                    'split': split
-                }).get('proj_inds', None)
-            if proj_inds is None:
-                proj_inds = np.arange(
-                    self.test_probs[self.curr_cloud_id].shape[0])
-            test_labels = np.argmax(
-                self.test_probs[self.curr_cloud_id][proj_inds], 1)
-
-            self.ori_test_probs.append(
-                self.test_probs[self.curr_cloud_id][proj_inds])
-            self.ori_test_labels.append(test_labels)
+        # Count once, after update_probs which may mark the whole cloud done.
+        this_possiblility = sampler.possibilities[sampler.cloud_id]
+        num_done = np.count_nonzero(this_possiblility > end_threshold)
+        self.pbar.update(num_done - self.pbar_update)
+        self.pbar_update = num_done
+
+        if split in ['test'] and num_done == this_possiblility.shape[0]:
+
+            proj_inds = self.get_proj_inds(self.curr_cloud_id, split)
+            test_probs = self.test_probs[self.curr_cloud_id]
+            if proj_inds is not None:
+                test_probs = test_probs[torch.as_tensor(
+                    proj_inds, dtype=torch.int64, device=test_probs.device)]
+            test_labels = torch.argmax(test_probs, 1)
+
+            self.ori_test_probs.append(test_probs.cpu().numpy())
+            self.ori_test_labels.append(test_labels.cpu().numpy())
+            # Release the device buffer of the finished cloud.
+            self.test_probs[self.curr_cloud_id] = None
             self.complete_infer = True
 
+    def get_proj_inds(self, cloud_id, split):
+        """Get the indices projecting the preprocessed points of a cloud back
+        to its original points, or None if the model does not subsample.
+
+        Reuses the preprocessed cache of the dataloader when it holds the
+        indices. The cache is keyed by cloud name only, so an entry written
+        for another split (e.g. validation) may lack them; preprocess is run
+        again in that case.
+        """
+        cache_convert = getattr(self.torch_split, 'cache_convert', None)
+        if cache_convert:
+            attr = self.dataset_split.get_attr(cloud_id)
+            data = cache_convert(attr['name'])
+            if 'proj_inds' in data:
+                return data['proj_inds']
+        data = self.model.preprocess(self.dataset_split.get_data(cloud_id),
+                                     {'split': split})
+        return data.get('proj_inds', None)
+
     def run_train(self):
         torch.manual_seed(self.rng.integers(np.iinfo(
             np.int32).max))  # Random reproducible seed for torch
@@ -318,13 +435,17 @@ class SemanticSegmentation(BasePipeline):
 
         cfg = self.cfg
         model.to(device)
+        if cfg.get('channels_last', False) and device.type == 'cuda':
+            # Only 4D conv weights change layout, e.g. the shared MLPs of
+            # RandLANet; point inputs are left as they are.
+            model.to(memory_format=torch.channels_last)
 
         log.info("DEVICE : {}".format(device))
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
         log_file_path = join(cfg.logs_dir, 'log_train_' + timestamp + '.txt')
         log.info("Logging in file : {}".format(log_file_path))
-        log.addHandler(logging.FileHandler(log_file_path))
+        self.set_log_file(log_file_path)
 
         Loss = SemSegLoss(self, model, dataset, device)
         self.metric_train = SemSegMetric()
@@ -332,6 +453,14 @@ class SemanticSegmentation(BasePipeline):
 
         self.batcher = self.get_batcher(device)
 
+        # Keep workers alive across epochs and their input queue deep, since
+        # preprocess and transform are CPU heavy.
+        num_workers = cfg.get('num_workers', min(8, os.cpu_count() or 1))
+        worker_kwargs = {}
+        if num_workers > 0:
+            worker_kwargs = dict(persistent_workers=True,
+                                 prefetch_factor=cfg.get('prefetch_factor', 4))
+
         train_dataset = dataset.get_split('train')
         train_sampler = train_dataset.sampler
         train_split = TorchDataloader(dataset=train_dataset,
@@ -346,11 +475,12 @@ class SemanticSegmentation(BasePipeline):
             train_split,
             batch_size=cfg.batch_size,
             sampler=get_sampler(train_sampler),
-            num_workers=cfg.get('num_workers', 2),
-            pin_memory=cfg.get('pin_memory', True),
+            num_workers=num_workers,
+            pin_memory=cfg.get('pin_memory', device.type == 'cuda'),
             collate_fn=self.batcher.collate_fn,
             worker_init_fn=lambda x: np.random.seed(x + np.uint32(
-                torch.utils.data.get_worker_info().seed))
+                torch.utils.data.get_worker_info().seed)),
+            **worker_kwargs
         )  # numpy expects np.uint32, whereas torch returns np.uint64.
 
         valid_dataset = dataset.get_split('validation')
@@ -367,11 +497,12 @@ class SemanticSegmentation(BasePipeline):
             valid_split,
             batch_size=cfg.val_batch_size,
             sampler=get_sampler(valid_sampler),
-            num_workers=cfg.get('num_workers', 2),
-            pin_memory=cfg.get('pin_memory', True),
+            num_workers=num_workers,
+            pin_memory=cfg.get('pin_memory', device.type == 'cuda'),
             collate_fn=self.batcher.collate_fn,
             worker_init_fn=lambda x: np.random.seed(x + np.uint32(
-                torch.utils.data.get_worker_info().seed)))
+                torch.utils.data.get_worker_info().seed)),
+            **worker_kwargs)
 
         self.optimizer, self.scheduler = model.get_optimizer(cfg)
 
@@ -391,6 +522,13 @@ class SemanticSegmentation(BasePipeline):
         log.info("Writing summary in {}.".format(self.tensorboard_dir))
         record_summary = cfg.get('summary').get('record_for', [])
 
+        # Mixed precision is opt-in since not all custom ops support half
+        # precision. Loss scaling is only needed for float16.
+        use_amp = cfg.get('amp', False) and device.type == 'cuda'
+        amp_dtype = torch.bfloat16 if cfg.get('bf16', False) else torch.float16
+        self.scaler = torch.cuda.amp.GradScaler(
+            enabled=use_amp and amp_dtype == torch.float16)
+
         log.info("Started training")
 
         for epoch in range(0, cfg.max_epoch + 1):
@@ -399,29 +537,38 @@ class SemanticSegmentation(BasePipeline):
             model.train()
             self.metric_train.reset()
             self.metric_val.reset()
-            self.losses = []
+            # Accumulate the loss on the device to avoid a sync every step.
+            self.losses = LossAccum()
             model.trans_point_sampler = train_sampler.get_point_sampler()
 
-            for step, inputs in enumerate(tqdm(train_loader, desc='training')):
-                if hasattr(inputs['data'], 'to'):
-                    inputs['data'].to(device)
-                self.optimizer.zero_grad()
-                results = model(inputs['data'])
-                loss, gt_labels, predict_scores = model.get_loss(
-                    Loss, results, inputs, device)
+            progress_bar = tqdm(CUDAPrefetcher(train_loader, device),
+                                desc='training')
+            for step, inputs in enumerate(progress_bar):
+                self.optimizer.zero_grad(set_to_none=True)
+                with torch.autocast(device_type=device.type,
+                                    dtype=amp_dtype,
+                                    enabled=use_amp):
+                    results = model(inputs['data'])
+                    loss, gt_labels, predict_scores = model.get_loss(
+                        Loss, results, inputs, device)
 
                 if predict_scores.size()[-1] == 0:
                     continue
 
-                loss.backward()
+                self.scaler.scale(loss).backward()
                 if model.cfg.get('grad_clip_norm', -1) > 0:
+                    self.scaler.unscale_(self.optimizer)
                     torch.nn.utils.clip_grad_value_(model.parameters(),
                                                     model.cfg.grad_clip_norm)
-                self.optimizer.step()
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
 
                 self.metric_train.update(predict_scores, gt_labels)
 
-                self.losses.append(loss.cpu().item())
+                self.losses.add(loss)
+                if self.losses.n % cfg.get('log_every', 50) == 0:
+                    progress_bar.set_postfix(loss=self.losses.mean(),
+                                             refresh=False)
                 # Save only for the first pcd in batch
                 if 'train' in record_summary and step == 0:
                     self.summary['train'] = self.get_3d_summary(
@@ -431,25 +578,26 @@ class SemanticSegmentation(BasePipeline):
 
             # --------------------- validation
             model.eval()
-            self.valid_losses = []
+            self.valid_losses = LossAccum()
             model.trans_point_sampler = valid_sampler.get_point_sampler()
 
             with torch.no_grad():
                 for step, inputs in enumerate(
-                        tqdm(valid_loader, desc='validation')):
-                    if hasattr(inputs['data'], 'to'):
-                        inputs['data'].to(device)
-
-                    results = model(inputs['data'])
-                    loss, gt_labels, predict_scores = model.get_loss(
-                        Loss, results, inputs, device)
+                        tqdm(CUDAPrefetcher(valid_loader, device),
+                             desc='validation')):
+                    with torch.autocast(device_type=device.type,
+                                        dtype=amp_dtype,
+                                        enabled=use_amp):
+                        results = model(inputs['data'])
+                        loss, gt_labels, predict_scores = model.get_loss(
+                            Loss, results, inputs, device)
 
                     if predict_scores.size()[-1] == 0:
                         continue
 
                     self.metric_val.update(predict_scores, gt_labels)
 
-                    self.valid_losses.append(loss.cpu().item())
+                    self.valid_losses.add(loss)
                     # Save only for the first batch
                     if 'valid' in record_summary and step == 0:
                         self.summary['valid'] = self.get_3d_summary(
@@ -460,6 +608,17 @@ class SemanticSegmentation(BasePipeline):
             if epoch % cfg.save_ckpt_freq == 0 or epoch == cfg.max_epoch:
                 self.save_ckpt(epoch)
 
+        self.wait_ckpt()
+
+    def set_log_file(self, log_file_path):
+        """Log to the given file, replacing the file handler of a previous
+        run of this pipeline."""
+        if getattr(self, 'log_handler', None) is not None:
+            log.removeHandler(self.log_handler)
+            self.log_handler.close()
+        self.log_handler = logging.FileHandler(log_file_path)
+        log.addHandler(self.log_handler)
+
     def get_batcher(self, device, split='training'):
         """Get the batcher to be used based on the device and split."""
         batcher_name = getattr(self.model.cfg, 'batcher')
@@ -472,6 +631,7 @@ class SemanticSegmentation(BasePipeline):
             batcher = None
         return batcher
 
+    @torch.inference_mode()
     def get_3d_summary(self, results, input_data, epoch, save_gt=True):
         """
         Create visualization for network inputs and outputs.
@@ -510,6 +670,9 @@ class SemanticSegmentation(BasePipeline):
             max_pts = np.iinfo(np.int32).max
         use_reference = cfg.get('use_reference', False)
         max_outputs = cfg.get('max_outputs', 1)
+        # With use_reference the points and labels of the first step are
+        # reused, later steps only need the predictions.
+        need_pcd = self._first_step == epoch or not use_reference
         input_pcd = []
         gt_labels = []
         predict_labels = []
@@ -519,68 +682,69 @@ class SemanticSegmentation(BasePipeline):
             new_shape = (1,) * add_dims[0] + sten.shape + (1,) * add_dims[1]
             return sten.reshape(new_shape)
 
+        def take_rows(tensor, inds, sizes):
+            if inds is None:
+                # The clouds are the leading rows, slice without a copy.
+                return tensor[:sum(sizes)]
+            return tensor.index_select(0, inds.to(tensor.device))
+
+        def split_sum_fmt(tensor, sizes, add_dims, dtype=torch.int32):
+            # Copy, convert and reshape once, the per cloud tensors are views
+            # of the result.
+            sten = to_sum_fmt(tensor, add_dims, dtype)
+            return list(torch.split(sten, sizes, dim=add_dims[0]))
+
+        name = self.model.cfg['name']
         # Variable size point clouds
-        if self.model.cfg['name'] in ('KPFCNN', 'KPConv'):
-            batch_lengths = input_data.lengths[0].detach().numpy()
-            row_splits = np.hstack(((0,), np.cumsum(batch_lengths)))
-            max_outputs = min(max_outputs, len(row_splits) - 1)
-            for k in range(max_outputs):
-                blen_k = row_splits[k + 1] - row_splits[k]
-                pcd_step = int(np.ceil(blen_k / min(max_pts, blen_k)))
-                res_pcd = results[row_splits[k]:row_splits[k + 1]:pcd_step, :]
-                predict_labels.append(
-                    to_sum_fmt(torch.argmax(res_pcd, 1), (0, 1)))
-                if self._first_step != epoch and use_reference:
-                    continue
-                pointcloud = input_data.points[0][
-                    row_splits[k]:row_splits[k + 1]:pcd_step]
-                input_pcd.append(
-                    to_sum_fmt(pointcloud[:, :3], (0, 0), torch.float32))
-                if torch.any(input_data.labels != 0):
-                    gtl = input_data.labels[row_splits[k]:row_splits[k + 1]]
-                    gt_labels.append(to_sum_fmt(gtl, (0, 1)))
-
-        elif self.model.cfg['name'] in ('SparseConvUnet', 'PointTransformer'):
-            if self.model.cfg['name'] == 'SparseConvUnet':
-                row_splits = np.hstack(
-                    ((0,), np.cumsum(input_data.batch_lengths)))
-            else:
+        if name in ('KPFCNN', 'KPConv', 'SparseConvUnet', 'PointTransformer'):
+            if name == 'SparseConvUnet':
+                row_splits = _row_splits_from_lengths(input_data.batch_lengths)
+            elif name == 'PointTransformer':
                 row_splits = input_data.row_splits
+            else:
+                row_splits = _row_splits_from_lengths(input_data.lengths[0])
             max_outputs = min(max_outputs, len(row_splits) - 1)
-            for k in range(max_outputs):
-                blen_k = row_splits[k + 1] - row_splits[k]
-                pcd_step = int(np.ceil(blen_k / min(max_pts, blen_k)))
-                res_pcd = results[row_splits[k]:row_splits[k + 1]:pcd_step, :]
-                predict_labels.append(
-                    to_sum_fmt(torch.argmax(res_pcd, 1), (0, 1)))
-                if self._first_step != epoch and use_reference:
-                    continue
-                if self.model.cfg['name'] == 'SparseConvUnet':
-                    pointcloud = input_data.point[k]
+            # Build the indices where the results are. SparseConvUnet and
+            # PointTransformer keep their splits on the host.
+            row_splits = row_splits.to(results.device)
+            inds, sizes = _strided_row_inds(row_splits, max_outputs, max_pts)
+            predict_labels = split_sum_fmt(
+                torch.argmax(take_rows(results, inds, sizes), 1), sizes, (0, 1))
+            if need_pcd:
+                labels = None
+                if name == 'SparseConvUnet':
+                    # Per point cloud lists, the first max_outputs clouds
+                    # cover the rows [0, row_splits[max_outputs]).
+                    points = torch.cat(
+                        [pc[:, :3] for pc in input_data.point[:max_outputs]])
+                    if save_gt and input_data.label is not None:
+                        labels = torch.cat(input_data.label[:max_outputs])
+                elif name == 'PointTransformer':
+                    points = input_data.point[:, :3]
+                    if save_gt:
+                        labels = getattr(input_data, 'label', None)
                 else:
-                    pointcloud = input_data.point[
-                        row_splits[k]:row_splits[k + 1]:pcd_step]
-                input_pcd.append(
-                    to_sum_fmt(pointcloud[:, :3], (0, 0), torch.float32))
-                if getattr(input_data, 'label', None) is not None:
-                    if self.model.cfg['name'] == 'SparseConvUnet':
-                        gtl = input_data.label[k]
-                    else:
-                        gtl = input_data.label[
-                            row_splits[k]:row_splits[k + 1]:pcd_step]
-                    gt_labels.append(to_sum_fmt(gtl, (0, 1)))
+                    points = input_data.points[0][:, :3]
+                    # Reduce the labels directly instead of through a
+                    # boolean mask of the whole batch.
+                    if save_gt and input_data.labels.any().item():
+                        labels = input_data.labels
+                input_pcd = split_sum_fmt(take_rows(points, inds, sizes), sizes,
+                                          (0, 0), torch.float32)
+                if labels is not None:
+                    gt_labels = split_sum_fmt(take_rows(labels, inds, sizes),
+                                              sizes, (0, 1))
         # Fixed size point clouds
-        elif self.model.cfg['name'] in ('RandLANet', 'PVCNN'):  # Tuple input
-            if self.model.cfg['name'] == 'RandLANet':
+        elif name in ('RandLANet', 'PVCNN'):  # Tuple input
+            if name == 'RandLANet':
                 pointcloud = input_data['xyz'][0]  # 0 => input to first layer
-            elif self.model.cfg['name'] == 'PVCNN':
+            elif name == 'PVCNN':
                 pointcloud = input_data['point'].transpose(1, 2)
-            pcd_step = int(
-                np.ceil(pointcloud.shape[1] /
-                        min(max_pts, pointcloud.shape[1])))
+            num_pts = pointcloud.shape[1]
+            pcd_step = -(-num_pts // min(max_pts, num_pts))
             predict_labels = to_sum_fmt(
                 torch.argmax(results[:max_outputs, ::pcd_step, :], 2), (0, 1))
-            if self._first_step == epoch or not use_reference:
+            if need_pcd:
                 input_pcd = to_sum_fmt(pointcloud[:max_outputs, ::pcd_step, :3],
                                        (0, 0), torch.float32)
                 if save_gt:
@@ -591,12 +755,11 @@ class SemanticSegmentation(BasePipeline):
                     gt_labels = to_sum_fmt(gtl[:max_outputs, ::pcd_step],
                                            (0, 1))
         else:
-            raise NotImplementedError(
-                "Saving 3D summary for the model "
-                f"{self.model.cfg['name']} is not implemented.")
+            raise NotImplementedError("Saving 3D summary for the model "
+                                      f"{name} is not implemented.")
 
         def get_reference_or(data_tensor):
-            if self._first_step == epoch or not use_reference:
+            if need_pcd:
                 return data_tensor
             return self._first_step
 
@@ -612,39 +775,26 @@ class SemanticSegmentation(BasePipeline):
 
     def save_logs(self, writer, epoch):
         """Save logs from the training and send results to TensorBoard."""
-        train_accs = self.metric_train.acc()
-        val_accs = self.metric_val.acc()
+        # Only the overall values, the last entries, are logged.
+        train_acc = self.metric_train.acc()[-1]
+        val_acc = self.metric_val.acc()[-1]
 
-        train_ious = self.metric_train.iou()
-        val_ious = self.metric_val.iou()
+        train_iou = self.metric_train.iou()[-1]
+        val_iou = self.metric_val.iou()[-1]
 
-        loss_dict = {
-            'Training loss': np.mean(self.losses),
-            'Validation loss': np.mean(self.valid_losses)
-        }
-        acc_dicts = [{
-            'Training accuracy': acc,
-            'Validation accuracy': val_acc
-        } for acc, val_acc in zip(train_accs, val_accs)]
-
-        iou_dicts = [{
-            'Training IoU': iou,
-            'Validation IoU': val_iou
-        } for iou, val_iou in zip(train_ious, val_ious)]
-
-        for key, val in loss_dict.items():
-            writer.add_scalar(key, val, epoch)
-        for key, val in acc_dicts[-1].items():
-            writer.add_scalar("{}/ Overall".format(key), val, epoch)
-        for key, val in iou_dicts[-1].items():
-            writer.add_scalar("{}/ Overall".format(key), val, epoch)
-
-        log.info(f"Loss train: {loss_dict['Training loss']:.3f} "
-                 f" eval: {loss_dict['Validation loss']:.3f}")
-        log.info(f"Mean acc train: {acc_dicts[-1]['Training accuracy']:.3f} "
-                 f" eval: {acc_dicts[-1]['Validation accuracy']:.3f}")
-        log.info(f"Mean IoU train: {iou_dicts[-1]['Training IoU']:.3f} "
-                 f" eval: {iou_dicts[-1]['Validation IoU']:.3f}")
+        train_loss = self.losses.mean()
+        val_loss = self.valid_losses.mean()
+
+        writer.add_scalar('Training loss', train_loss, epoch)
+        writer.add_scalar('Validation loss', val_loss, epoch)
+        writer.add_scalar('Training accuracy/ Overall', train_acc, epoch)
+        writer.add_scalar('Validation accuracy/ Overall', val_acc, epoch)
+        writer.add_scalar('Training IoU/ Overall', train_iou, epoch)
+        writer.add_scalar('Validation IoU/ Overall', val_iou, epoch)
+
+        log.info(f"Loss train: {train_loss:.3f}  eval: {val_loss:.3f}")
+        log.info(f"Mean acc train: {train_acc:.3f}  eval: {val_acc:.3f}")
+        log.info(f"Mean IoU train: {train_iou:.3f}  eval: {val_iou:.3f}")
 
         for stage in self.summary:
             for key, summary_dict in self.summary[stage].items():
@@ -661,6 +811,7 @@ class SemanticSegmentation(BasePipeline):
         """
         train_ckpt_dir = join(self.cfg.logs_dir, 'checkpoint')
         make_dir(train_ckpt_dir)
+        self.wait_ckpt()
 
         if ckpt_path is None:
             ckpt_path = latest_torch_ckpt(train_ckpt_dir)
@@ -674,8 +825,14 @@ class SemanticSegmentation(BasePipeline):
             raise FileNotFoundError(f' ckpt {ckpt_path} not found')
 
         log.info(f'Loading checkpoint {ckpt_path}')
-        ckpt = torch.load(ckpt_path, map_location=self.device)
-        self.model.load_state_dict(ckpt['model_state_dict'])
+        try:
+            # Map the file instead of reading it into memory first.
+            ckpt = torch.load(ckpt_path, map_location=self.device, mmap=True)
+        except (TypeError, RuntimeError):
+            # torch < 2.1 or a checkpoint in the legacy format.
+            ckpt = torch.load(ckpt_path, map_location=self.device)
+        model = getattr(self.model, 'module', self.model)
+        model.load_state_dict(ckpt['model_state_dict'])
         if 'optimizer_state_dict' in ckpt and hasattr(self, 'optimizer'):
             log.info(f'Loading checkpoint optimizer_state_dict')
             self.optimizer.load_state_dict(ckpt['optimizer_state_dict'])
@@ -684,17 +841,40 @@ class SemanticSegmentation(BasePipeline):
             self.scheduler.load_state_dict(ckpt['scheduler_state_dict'])
 
     def save_ckpt(self, epoch):
-        """Save a checkpoint at the passed epoch."""
+        """Save a checkpoint at the passed epoch.
+
+        The states are copied to the host and written to disk in a background
+        thread while training continues.
+        """
         path_ckpt = join(self.cfg.logs_dir, 'checkpoint')
         make_dir(path_ckpt)
-        torch.save(
+        self.wait_ckpt()
+        # Save the weights of the wrapped module for DataParallel and DDP
+        # models so that the keys match the plain model.
+        model = getattr(self.model, 'module', self.model)
+        state = _cpu_snapshot(
             dict(epoch=epoch,
-                 model_state_dict=self.model.state_dict(),
+                 model_state_dict=model.state_dict(),
                  optimizer_state_dict=self.optimizer.state_dict(),
-                 scheduler_state_dict=self.scheduler.state_dict()),
-            join(path_ckpt, f'ckpt_{epoch:05d}.pth'))
+                 scheduler_state_dict=self.scheduler.state_dict()))
+        self.ckpt_future = self.ckpt_executor.submit(
+            self.write_ckpt, state, join(path_ckpt, f'ckpt_{epoch:05d}.pth'))
         log.info(f'Epoch {epoch:3d}: save ckpt to {path_ckpt:s}')
 
+    @staticmethod
+    def write_ckpt(state, ckpt_path):
+        """Write a checkpoint state to disk."""
+        # Besides the tensor data torch.save writes many small zip records,
+        # go through a large buffer.
+        with open(ckpt_path, 'wb', buffering=16 << 20) as f:
+            torch.save(state, f)
+
+    def wait_ckpt(self):
+        """Wait until the checkpoint being saved is on disk."""
+        if self.ckpt_future is not None:
+            self.ckpt_future.result()
+            self.ckpt_future = None
+
     def save_config(self, writer):
         """Save experiment configuration with tensorboard summary."""
         if hasattr(self, 'cfg_tb'):
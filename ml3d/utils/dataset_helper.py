@@ -57,8 +57,6 @@ class Cache(object):
 
             self._write(output, fpath)
             self.cached_ids.append(unique_id)
-        else:
-            output = self._read(fpath)
 
         return self._read(fpath)
 
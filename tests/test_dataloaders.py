@@ -0,0 +1,57 @@
+import pytest
+import types
+import numpy as np
+import open3d as o3d
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+@pytest.mark.skipif("not o3d._build_config['BUILD_PYTORCH_OPS']")
+def test_on_device_torch(monkeypatch):
+    from open3d._ml3d.torch.dataloaders.concat_batcher import _on_device
+
+    cpu_tensor = torch.zeros(3)
+    assert _on_device(cpu_tensor, 'cpu')
+    assert _on_device(cpu_tensor, torch.device('cpu'))
+    assert not _on_device(cpu_tensor, 'cuda')
+
+    # Only the device of the tensor is read, so no GPU is needed.
+    cuda_tensor = types.SimpleNamespace(device=torch.device('cuda', 0))
+    monkeypatch.setattr(torch.cuda, 'current_device', lambda: 0)
+    assert _on_device(cuda_tensor, 'cuda')
+    assert _on_device(cuda_tensor, torch.device('cuda'))
+    assert _on_device(cuda_tensor, 'cuda:0')
+    assert not _on_device(cuda_tensor, 'cuda:1')
+    assert not _on_device(cuda_tensor, 'cpu')
+
+    monkeypatch.setattr(torch.cuda, 'current_device', lambda: 1)
+    assert not _on_device(cuda_tensor, 'cuda')
+
+
+@pytest.mark.skipif("not o3d._build_config['BUILD_PYTORCH_OPS']")
+def test_batch_to_device_torch():
+    import open3d.ml.torch as ml3d
+    from open3d._ml3d.torch.dataloaders.concat_batcher import (
+        PointTransformerBatch, SparseConvUnetBatch)
+
+    data = [{
+        'data': {
+            'point': torch.rand(n, 3),
+            'feat': torch.rand(n, 3),
+            'label': torch.randint(4, (n,))
+        }
+    } for n in (5, 7)]
+
+    for batch_class in (PointTransformerBatch, SparseConvUnetBatch):
+        batch = batch_class(data)
+        point = batch.point
+        assert batch.to('cpu') is batch
+        assert batch.to(torch.device('cpu')) is batch
+        assert batch.point is point
+
+        inputs = {'data': batch, 'attr': [{'split': 'test'}]}
+        moved = ml3d.dataloaders.batch_to_device(inputs, torch.device('cpu'))
+        assert moved['data'] is batch
+        assert moved['attr'] == inputs['attr']
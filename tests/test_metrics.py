@@ -0,0 +1,56 @@
+import pytest
+import numpy as np
+import open3d as o3d
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+@pytest.mark.skipif("not o3d._build_config['BUILD_PYTORCH_OPS']")
+def test_semseg_metric_torch():
+    import open3d.ml.torch as ml3d
+
+    rng = np.random.default_rng(42)
+    num_classes = 4
+    scores = rng.random((2, 100, num_classes)).astype(np.float32)
+    # Class 2 is predicted but never labeled, class 3 is neither.
+    scores[..., 3] -= 1
+    labels = rng.integers(0, 2, size=(2, 100))
+
+    metric = ml3d.modules.metrics.SemSegMetric()
+    assert metric.acc() is None
+    assert metric.iou() is None
+
+    metric.update(torch.from_numpy(scores[0]), torch.from_numpy(labels[0]))
+    host_conf = metric.get_host_confusion_matrix()
+    assert metric.get_host_confusion_matrix() is host_conf
+
+    metric.update(torch.from_numpy(scores[1]), torch.from_numpy(labels[1]))
+    assert metric.host_confusion_matrix is None
+
+    conf = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(conf, (labels.ravel(), scores.argmax(-1).ravel()), 1)
+    np.testing.assert_array_equal(metric.get_host_confusion_matrix(), conf)
+
+    tp = np.diag(conf)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ref_acc = tp / conf.sum(axis=1)
+        ref_iou = tp / (conf.sum(axis=1) + conf.sum(axis=0) - tp)
+
+    acc = metric.acc()
+    assert len(acc) == num_classes + 1
+    assert np.isnan(acc[2]) and np.isnan(acc[3])
+    np.testing.assert_allclose(acc[:-1], ref_acc)
+    np.testing.assert_allclose(acc[-1], np.nanmean(ref_acc))
+
+    iou = metric.iou()
+    assert len(iou) == num_classes + 1
+    assert iou[2] == 0 and np.isnan(iou[3])
+    np.testing.assert_allclose(iou[:-1], ref_iou)
+    np.testing.assert_allclose(iou[-1], np.nanmean(ref_iou))
+
+    metric.reset()
+    assert metric.host_confusion_matrix is None
+    assert not metric.confusion_matrix.any()
+    np.testing.assert_array_equal(metric.get_host_confusion_matrix(), 0)
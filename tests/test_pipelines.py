@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+import open3d as o3d
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+@pytest.mark.skipif("not o3d._build_config['BUILD_PYTORCH_OPS']")
+@pytest.mark.parametrize('lengths, num_clouds, max_pts', [
+    ([1000, 37, 4096, 5], 4, 512),
+    ([1000, 37, 4096, 5], 2, 512),
+    ([1000, 37, 4096, 5], 1, 37),
+    ([7, 3, 9], 3, 100),
+    ([7, 3, 9], 2, 8),
+    ([5001, 4999, 2], 3, 2500),
+])
+def test_strided_row_inds_torch(lengths, num_clouds, max_pts):
+    from open3d._ml3d.torch.pipelines.semantic_segmentation import \
+        _strided_row_inds
+
+    row_splits = np.hstack(((0,), np.cumsum(lengths)))
+    ref_inds = []
+    for k in range(num_clouds):
+        blen_k = row_splits[k + 1] - row_splits[k]
+        pcd_step = int(np.ceil(blen_k / min(max_pts, blen_k)))
+        ref_inds.append(np.arange(row_splits[k], row_splits[k + 1], pcd_step))
+
+    inds, sizes = _strided_row_inds(torch.from_numpy(row_splits), num_clouds,
+                                    max_pts)
+
+    assert sizes == [len(ind) for ind in ref_inds]
+    if inds is None:
+        # No cloud is strided, the leading rows are taken as they are.
+        inds = torch.arange(sum(sizes))
+    assert inds.dtype == torch.int64
+    np.testing.assert_array_equal(inds.numpy(), np.concatenate(ref_inds))